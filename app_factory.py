@@ -0,0 +1,59 @@
+
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from logger import PostgresLogger, BatchedLogger
+from messenger import TwilioMessenger
+from scheduler import Scheduler
+
+
+#
+# Builds the service singletons shared by both Flask apps. A process hosting
+# either app (or both) gets one connection pool, one Twilio session, and one
+# scheduler instead of a set per module.
+#
+
+# Logging is configured once here; modules use lazily formatted module loggers
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+load_dotenv("auth.env")
+
+_logger = None
+_messenger = None
+_scheduler = None
+
+
+def get_logger():
+    '''Returns the shared BatchedLogger (and its single connection pool).'''
+    global _logger
+    if _logger is None:
+        _logger = BatchedLogger(PostgresLogger(
+            host=os.getenv("DB_HOST"),
+            dbname=os.getenv("DB_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT")
+        ))
+    return _logger
+
+
+def get_messenger():
+    '''Returns the shared TwilioMessenger (one keep-alive HTTP session).'''
+    global _messenger
+    if _messenger is None:
+        _messenger = TwilioMessenger(
+            os.getenv("TWILIO_ACCOUNT_SID"),
+            os.getenv("TWILIO_AUTH_TOKEN"),
+            os.getenv("TWILIO_DEFAULT_FROM")
+        )
+    return _messenger
+
+
+def get_scheduler():
+    '''Returns the shared Scheduler.'''
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = Scheduler()
+    return _scheduler
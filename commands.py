@@ -3,8 +3,27 @@ from scheduler import Scheduler
 
 from logger import Logger
 from abc import ABC, abstractmethod
+from functools import lru_cache
+import logging
+import re
 
+log = logging.getLogger(__name__)
 
+
+#----------- Message Bodies -----------#
+# Built once at import so the hot path never re-formats identical text
+INFO_BODY = "LSSD Work‑Alone — Available Commands\n\n\"BEGIN\"\nStart a new Work‑Alone session.\n\n\"DONE\"\nEnd your active Work‑Alone session.\n\n\"INFO\"\nDisplay availiable commands for the Work-ALone System.\n\n(any message)\nCounts as a check‑in during an active session."
+BEGIN_CONFIRM_TMPL = "Your Work‑Alone session is now active.\n\nPlease reply “DONE” when you have finished working alone.\nYou will receive a check‑in message in {interval}."
+DONE_CONFIRM_BODY = "Your Work‑Alone session has been ended. Stay safe!"
+CHECK_IN_CONFIRM_BODY = "Thank you for your response. Your check‑in has been recorded."
+NOTIFY_REMINDER_BODY = "This is a reminder from the LSSD Work‑Alone System.\n\nPlease respond with anything to this message so we can confirm that you are safe, or if you are finished working alone reply “DONE” to end the session."
+CALL_VOICE_BODY = "This is a reminder from the LSSD Work‑Alone System. Please respond with a message so we can confirm your safety."
+CALL_REMINDER_TMPL = "This is a reminder from the LSSD Work‑Alone System.\nIf you are finished working alone reply “DONE” to end the session.\nPlease reply within {interval}.\nIf we do not hear from you, your designated contacts will be notified to check on you."
+ESCALATED_BODY = "Your escalation contacts have been notified due to inactivity."
+
+
+# Delay intervals come from a small fixed set, so cache the rendered text
+@lru_cache(maxsize=128)
 def minutes_to_text(minutes: int) -> str:
     if minutes < 60:
         return f"{minutes} minute(s)"
@@ -15,17 +34,23 @@ def minutes_to_text(minutes: int) -> str:
     return f"{hours} hour(s) and {rem_minutes} minute(s)"
 
 
+# The interval-dependent bodies only vary by delay interval, which comes from a
+# small fixed set, so the rendered text is cached per interval
+@lru_cache(maxsize=128)
+def _begin_confirm_body(delay_interval: int) -> str:
+    return BEGIN_CONFIRM_TMPL.format(interval=minutes_to_text(delay_interval))
+
+@lru_cache(maxsize=128)
+def _call_reminder_body(delay_interval: int) -> str:
+    return CALL_REMINDER_TMPL.format(interval=minutes_to_text(delay_interval))
+
+
+# Matches the first run of digits in a message
+_INT_RE = re.compile(r"\d+")
+
 def extract_int(text: str):
-    num = ""
-    found = False
-    for ch in text:
-        if ch.isdigit():
-            num += ch
-            found = True
-        elif found:
-            # We hit a non digit character, so stop
-            break
-    return int(num) if num else None
+    match = _INT_RE.search(text)
+    return int(match.group()) if match else None
 
 
 # Maps a command to a handler
@@ -33,24 +58,57 @@ class CommandMapper:
     def __init__(self, on_default:Command=None):
         self.commands = {}
         self.on_default = on_default
+        self._frozen = False
 
     def register(self, command: str, func: Command):
         self.commands[command.strip().lower()] = func
+        self._frozen = False
+
+    def freeze(self):
+        '''Call after all register() calls: pins the known commands for branch-based dispatch.'''
+        self._info = self.commands.get("info")
+        self._begin = self.commands.get("begin")
+        self._done = self.commands.get("done")
+        self._end = self.commands.get("end")
+        self._safe = self.commands.get("safe")
+        self._frozen = True
+
+    def execute(self, command_raw: str, to_number: str, message: str, *, cmd: str = None) -> str | None:
+        '''
+        Runs the handler for the command. Returns the handler's reply body, if any.
+        Pass cmd if the caller already tokenized the command word.
+        '''
+        if cmd is None:
+            if not isinstance(command_raw, str):
+                return None
+
+            # One pass: take the first whitespace-separated word, lowered
+            words = command_raw.split(maxsplit=1)
+            if not words:
+                return None
+            cmd = words[0].lower()
+
+        handler = None
+        if self._frozen:
+            # The command set is tiny and fixed, so a branch chain beats a dict hash here
+            if cmd == "info":
+                handler = self._info
+            elif cmd == "begin":
+                handler = self._begin
+            elif cmd == "done":
+                handler = self._done
+            elif cmd == "end":
+                handler = self._end
+            elif cmd == "safe":
+                handler = self._safe
 
-    def execute(self, command_raw: str, to_number: str, message: str) -> bool:
-        if type(command_raw) != str:
-            return False
-        command = command_raw.strip().split(" ")[0].lower()
-        handler = self.commands.get(command.strip().lower())
+        if handler is None:
+            handler = self.commands.get(cmd, self.on_default)
 
         if handler is None:
-            # No handler found, use default if available
-            if self.on_default is None:
-                return False
-            handler = self.on_default
+            return None
 
-        handler(message=message, to_number=to_number)
-        return True
+        return handler(message=message, to_number=to_number)
 
     def command_exists(self, command: str) -> bool:
         return command.strip().lower() in self.commands
@@ -63,6 +121,7 @@ class CommandMapper:
 class Command:
     @abstractmethod
     def __call__(self, message, to_number):
+        '''Handles the message. Returns the reply body for the sender, or None for no reply.'''
         pass
 
 
@@ -72,7 +131,7 @@ class InfoCommand(Command):
         self.messenger = messenger
 
     def __call__(self, message, to_number):
-        self.messenger.send_message(to_number, "LSSD Work‑Alone — Available Commands\n\n\"BEGIN\"\nStart a new Work‑Alone session.\n\n\"DONE\"\nEnd your active Work‑Alone session.\n\n\"INFO\"\nDisplay availiable commands for the Work-ALone System.\n\n(any message)\nCounts as a check‑in during an active session.")
+        return INFO_BODY
 # "begin"
 class BeginCommand(Command):
     '''
@@ -87,41 +146,37 @@ class BeginCommand(Command):
         self.logger = logger
 
     def __call__(self, message, to_number):
-        # Get the user ID from ph number
-        if not self.logger.user_exists(phone_number=to_number):
-            print(f"User with phone number {to_number} does not exist.")
-            return
+        # Get the user from ph number, one lookup covers the existence check too
         userData = self.logger.get_user(phone_number=to_number)
+        if userData is None:
+            log.warning("User with phone number %s does not exist.", to_number)
+            return
         user_id = userData.get("id", None)
         user_delay_interval = userData.get("delay_interval", 30)
         if user_id is None:
-            print(f"Could not retrieve user ID for phone number {to_number}.")
+            log.warning("Could not retrieve user ID for phone number %s.", to_number)
             return
 
         # Log the received message
         self.logger.log_user_message(user_id, message, "incoming")
 
         # Close any existing active sessions
-        existing_session = self.logger.get_active_session(user_id)
-        while existing_session is not None:
-            existing_session_id = existing_session.get("id")
-            self.logger.end_session(existing_session_id)
-            existing_session = self.logger.get_active_session(user_id)
+        self.logger.end_all_active_sessions(user_id)
         # Start a new session
         session_id = self.logger.start_session(user_id)
         if session_id is None:
-            print(f"Could not start a new session for user ID {user_id}.")
+            log.warning("Could not start a new session for user ID %s.", user_id)
             return
         
-        # Schedule notifications
-        self.scheduler.schedule_job(lambda: _notify_user_inactivity(to_number, session_id, self.messenger, self.scheduler, self.logger), run_in_minutes=user_delay_interval)
+        # One repeating job per session drives all the inactivity stages
+        self.scheduler.schedule_repeating(session_id, lambda: _session_tick(to_number, session_id, self.messenger, self.scheduler, self.logger), interval_minutes=user_delay_interval)
 
 
-        # Send confirmation message
-        to_send = f"Your Work‑Alone session is now active.\n\nPlease reply “DONE” when you have finished working alone.\nYou will receive a check‑in message in {minutes_to_text(user_delay_interval)}."
-        self.messenger.send_message(to_number, to_send)
+        # Confirmation goes back in the webhook response, no extra REST call
+        to_send = _begin_confirm_body(user_delay_interval)
         # Log this message
         self.logger.log_user_message(user_id, to_send, "outgoing")
+        return to_send
 
 
 
@@ -140,35 +195,29 @@ class DoneCommand(Command):
 
     def __call__(self, message, to_number):
 
-        # Get the user ID from ph number
-        if not self.logger.user_exists(phone_number=to_number):
-            print(f"User with phone number {to_number} does not exist.")
-            return
+        # Get the user from ph number, one lookup covers the existence check too
         userData = self.logger.get_user(phone_number=to_number)
+        if userData is None:
+            log.warning("User with phone number %s does not exist.", to_number)
+            return
         user_id = userData.get("id", None)
         if user_id is None:
-            print(f"Could not retrieve user ID for phone number {to_number}.")
+            log.warning("Could not retrieve user ID for phone number %s.", to_number)
             return
         
         # Log the received message
         self.logger.log_user_message(user_id, message, "incoming")
         
         # End any/all active sessions
-        existing_session = self.logger.get_active_session(user_id)
-        if existing_session is not None:
+        ended = self.logger.end_all_active_sessions(user_id)
+        if ended > 0:
 
-            # Close all existing sessions
-            while existing_session is not None:
-                existing_session_id = existing_session.get("id")
-                self.logger.end_session(existing_session_id)
-                existing_session = self.logger.get_active_session(user_id)
-
-            # Send confirmation message only if the user is actively in a session
-            to_send = "Your Work‑Alone session has been ended. Stay safe!"
-            self.messenger.send_message(to_number, to_send)
+            # Reply with confirmation only if the user was actively in a session
+            to_send = DONE_CONFIRM_BODY
 
             # Log this message
             self.logger.log_user_message(user_id, to_send, "outgoing")
+            return to_send
 
 
 # Default reply command (any unrecognized command)
@@ -180,43 +229,34 @@ class ReplyCommand(Command):
         self.info_command = InfoCommand(messenger)
     
     def __call__(self, message, to_number):
-        print(f"Processing check-in message from {to_number}.")
+        log.debug("Processing check-in message from %s.", to_number)
 
         # Get the user asociated with this phone number
         user_data = self.logger.get_user(phone_number=to_number)
         if user_data is None:
-            self.info_command(message, to_number)
-            return
+            return self.info_command(message, to_number)
         user_id = user_data.get("id")
         if user_id is None:
-            self.info_command(message, to_number)
-            return
+            return self.info_command(message, to_number)
 
         # Log the received message
         self.logger.log_user_message(user_id, message, "incoming")
 
 
-        # Make sure the user has an active session
-        if not self.logger.active_session_exists(user_id):
-            self.info_command(message, to_number)
-            return
-
-
-        # Get the active session for this user
+        # Get the active session for this user (doubles as the existence check)
         active_session = self.logger.get_active_session(user_id)
         if active_session is None:
-            self.info_command(message, to_number)
-            return
+            return self.info_command(message, to_number)
         session_id = active_session.get("id")
-        
+
 
         # If the user has a session, set their last check-in time to now
         self.logger.check_in_session(session_id)
 
-        # Send a confirmation
-        to_send = "Thank you for your response. Your check‑in has been recorded."
-        self.messenger.send_message(to_number, to_send)
+        # Reply with a confirmation
+        to_send = CHECK_IN_CONFIRM_BODY
         self.logger.log_user_message(user_id, to_send, "outgoing")
+        return to_send
 
 class SafeCommand(Command):
     def __init__(self, messenger:Messenger, scheduler:Scheduler, logger:Logger):
@@ -228,9 +268,7 @@ class SafeCommand(Command):
         # Lookup the users this safe message could be for (users whos most recent session is timeout)
         contactsTo = self.logger.get_recent_timeouts_for_contact(to_number)
         if contactsTo == None:
-            to_send = "All users are currently accounted for, no action is needed. Thanks for checking in!"
-            self.messenger.send_message(to_number, to_send)
-            return
+            return "All users are currently accounted for, no action is needed. Thanks for checking in!"
         
         numSessions = len(contactsTo)
         users = []
@@ -245,6 +283,9 @@ class SafeCommand(Command):
             session_id = contactsTo[0].get("session_id")
             user_id = contactsTo[0].get("user_id")
             contact = self.logger.get_escalation_contact(user_id=user_id, contact_phone_num=to_number)
+            if contact is None:
+                # The sender stopped being a contact for this user since the lookup
+                return "All users are currently accounted for, no action is needed. Thanks for checking in!"
             contact_id = contact.get("id")
 
             self.logger.log_contact_message(contact_id, message, "incoming")
@@ -253,10 +294,10 @@ class SafeCommand(Command):
             self.logger.deescalate_session(contact_id, session_id)
 
             to_send = "Thanks for checking in on them, the user has now been marked as safe. We appreciate your quick response."
-            self.messenger.send_message(to_number, to_send)
             self.logger.log_contact_message(contact_id, to_send, "outgoing")
-        
-        
+            return to_send
+
+
         # If n > 1 Respond with a message saying they have multiple unaccounted contacts
         else:
 
@@ -268,6 +309,9 @@ class SafeCommand(Command):
                         session_id = session.get("session_id")
                         user_id = session.get("user_id")
                         contact = self.logger.get_escalation_contact(user_id=user_id, contact_phone_num=to_number)
+                        if contact is None:
+                            # The sender stopped being a contact for this user since the lookup
+                            return "All users are currently accounted for, no action is needed. Thanks for checking in!"
                         contact_id = contact.get("id")
 
                         self.logger.log_contact_message(contact_id, message, "incoming")
@@ -275,22 +319,21 @@ class SafeCommand(Command):
                         # De escalate the session
                         self.logger.deescalate_session(contact_id, session_id)
                         to_send = "Thanks for checking in on them, the user has now been marked as safe. We appreciate your quick response."
-                        self.messenger.send_message(to_number, to_send)
 
                         self.logger.log_contact_message(contact_id, to_send, "outgoing")
-                        return
+                        return to_send
 
             # No user id was given or it is not valid
             to_send = "You have multiple users who have not checked in:\n\n"
             for session in contactsTo:
+                # The timeout rows already carry the user's name, no lookup per row
                 user_id = session.get("user_id")
-                user = self.logger.get_user(user_id=user_id)
-                to_send += f"{user.get("first_name")} {user.get("last_name")} -> {user_id}\n\n"
+                to_send += f"{session.get('first_name')} {session.get('last_name')} -> {user_id}\n\n"
 
             to_send += "To mark someone as safe, reply with: SAFE {user_id}\n\n"
             to_send += "For example: SAFE 42"
 
-            self.messenger.send_message(to_number, to_send)
+            return to_send
 
 
 
@@ -303,98 +346,77 @@ class SafeCommand(Command):
 
 
 #----------- Inactivity Methods -----------#
-def _notify_user_inactivity(to_number: str, session_id, messenger:Messenger, scheduler:Scheduler, logger:Logger):
-
-    # Get the interval / user id for the user
-    user_data = logger.get_user(phone_number=to_number)
-    user_delay_interval = user_data.get("delay_interval", 30)
-    user_id = user_data.get("id")
-
-
-    # Make sure the session hasn't ended
-    if logger.is_active_session(session_id) == None:
+def _session_tick(to_number: str, session_id, messenger:Messenger, scheduler:Scheduler, logger:Logger):
+    '''
+    Runs every delay_interval minutes for an active session (one repeating job
+    per session, armed by BeginCommand). Picks the inactivity stage from how
+    long the user has gone without checking in:
+    - under 1 interval: user checked in recently, nothing to do
+    - 1 interval overdue: reminder SMS
+    - 2 intervals overdue: voice call + warning SMS
+    - 3 intervals overdue: notify escalation contacts and close the session
+    Cancels itself once the session is no longer active.
+    '''
+    # One query covers the user, the session state and the time since last check-in
+    status = logger.get_session_status(session_id)
+    if status is None or status.get("status") != "active":
+        # Session ended (DONE, a new BEGIN, or escalation), stop ticking
+        scheduler.cancel(session_id)
         return
 
-    # Check if the user has checked in
-    lastCheckIn = logger.get_last_check_in(user_id)
+    user_delay_interval = status.get("delay_interval", 30)
+    lastCheckIn = status.get("minutes_since_check_in")
+    # No recorded check-in counts as maximally overdue
+    lastCheckIn = int(lastCheckIn) if lastCheckIn is not None else user_delay_interval * 3
+
     if lastCheckIn < user_delay_interval:
-        # Re schedule the checkin notification
-        scheduler.schedule_job(lambda: _notify_user_inactivity(to_number, session_id, messenger, scheduler, logger), run_in_minutes=user_delay_interval)
+        # User checked in recently, nothing to do this tick
         return
 
-    # User has not check in so send a reminder
-    messenger.send_message(to_number, f"This is a reminder from the LSSD Work‑Alone System.\n\nPlease respond with anything to this message so we can confirm that you are safe, or if you are finished working alone reply “DONE” to end the session.")
-    scheduler.schedule_job(lambda: _call_user_inactivity(to_number, session_id, messenger, scheduler, logger), run_in_minutes=user_delay_interval)
-
-
-def _call_user_inactivity(to_number: str, session_id, messenger:Messenger, scheduler:Scheduler, logger:Logger):
-    
-    # Get the interval for the user
-    user_data = logger.get_user(phone_number=to_number)
-    user_delay_interval = user_data.get("delay_interval", 30)
-    user_id = user_data.get("id")
-
-
-    # Make sure the session hasn't ended
-    if not logger.is_active_session(session_id):
+    if lastCheckIn < user_delay_interval * 2:
+        # First stage: reminder SMS
+        messenger.send_message(to_number, NOTIFY_REMINDER_BODY)
         return
 
-
-    # Check if the user has checked in
-    lastCheckIn = logger.get_last_check_in(user_id)
-    if lastCheckIn < user_delay_interval:
-        # Re schedule the checkin notification
-        scheduler.schedule_job(lambda: _notify_user_inactivity(to_number, session_id, messenger, scheduler, logger), run_in_minutes=user_delay_interval)
+    if lastCheckIn < user_delay_interval * 3:
+        # Second stage: voice call plus a final warning SMS
+        messenger.make_call(to_number, CALL_VOICE_BODY)
+        messenger.send_message(to_number, _call_reminder_body(user_delay_interval))
         return
 
-    # User has not checked in, schedule escalation
-    messenger.make_call(to_number, "This is a reminder from the LSSD Work‑Alone System. Please respond with a message so we can confirm your safety.")
-    messenger.send_message(to_number, f"This is a reminder from the LSSD Work‑Alone System.\nIf you are finished working alone reply “DONE” to end the session.\nPlease reply within {minutes_to_text(user_delay_interval)}.\nIf we do not hear from you, your designated contacts will be notified to check on you.")
-    scheduler.schedule_job(lambda: _escalate_inactivity(to_number, session_id, messenger, logger, scheduler), run_in_minutes=user_delay_interval)
-    
+    # Final stage: notify the escalation contacts and close the session
+    _escalate_inactivity(status, to_number, messenger, logger)
+    scheduler.cancel(session_id)
 
-def _escalate_inactivity(to_number: str, session_id, messenger:Messenger, logger:Logger, scheduler:Scheduler):
 
-    # Get the interval for the user
-    user_data = logger.get_user(phone_number=to_number)
-    user_id = user_data.get("id", None)
-    user_fname = user_data.get("first_name", "N/A")
-    user_lname = user_data.get("last_name", "N/A")
-    user_delay_interval = user_data.get("delay_interval", 30)
-    if user_id is None:
-        return
+def _escalate_inactivity(status: dict, to_number: str, messenger:Messenger, logger:Logger):
 
-    # Make sure the session hasn't ended
-    if not logger.is_active_session(session_id):
+    user_id = status.get("user_id", None)
+    user_fname = status.get("first_name", "N/A")
+    user_lname = status.get("last_name", "N/A")
+    if user_id is None:
         return
 
-    # Check if the user has checked in
-    lastCheckedIn = logger.get_last_check_in(user_id)
-    if lastCheckedIn < user_delay_interval:
-        scheduler.schedule_job(lambda:_notify_user_inactivity(to_number, session_id, messenger, scheduler, logger), run_in_minutes=user_delay_interval)
-        return
+    lastCheckedIn = status.get("minutes_since_check_in")
+    lastCheckedIn = int(lastCheckedIn) if lastCheckedIn is not None else 0
 
     # Fetch escalation contacts for the user
     contacts = logger.get_escalation_contacts(user_id=user_id)
     if contacts is None or len(contacts) == 0:
         return
-    
+
     # Send Contact messages
     for contact in contacts:
         contact_number = contact.get("phone_number", "")
-        print(f"Notifying contact {contact_number} for user {user_id} due to inactivity.")
+        log.info("Notifying contact %s for user %s due to inactivity.", contact_number, user_id)
         if contact_number != "":
             messenger.send_message(contact_number, f"Hello, This is a notification from the LSSD Work‑Alone System. {user_fname} {user_lname} at {to_number} has not responded for {minutes_to_text(lastCheckedIn)}.\nPlease check on them as soon as possible.\n\n Once you have made sure they are okay enter \"SAFE\" to log that they are okay.")
-        
+
     # Notify the user as well
-    messenger.send_message(to_number, "Your escalation contacts have been notified due to inactivity.")
+    messenger.send_message(to_number, ESCALATED_BODY)
 
     # Close the user's active session
-    existing_session = logger.get_active_session(user_id)
-    while existing_session is not None:
-        existing_session_id = existing_session.get("id")
-        logger.timeout_session(existing_session_id)
-        existing_session = logger.get_active_session(user_id)
+    logger.end_all_active_sessions(user_id, new_status="alert")
 
 
 
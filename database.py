@@ -1,10 +1,17 @@
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+import logging
+import os
 import sqlite3
+import threading
 import time
 
 
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
+
+log = logging.getLogger(__name__)
 
 
 #
@@ -25,6 +32,11 @@ class Database(ABC):
         ''' Executes a write query (INSERT, UPDATE, DELETE) and returns the number of affected rows. '''
         pass
 
+    @abstractmethod
+    def execute_many(self, sql: str, params_list:list) -> int:
+        ''' Executes a write query once per parameter set in a single commit. Returns the number of affected rows. '''
+        pass
+
     @abstractmethod
     def close(self) -> None:
         ''' Closes the database connection. '''
@@ -35,143 +47,400 @@ class Database(ABC):
 class SqliteDatabase(Database):
 
     def __init__(self, db_path: str):
-        
-        self.connection = sqlite3.connect(db_path, check_same_thread=False)
-        self.connection.row_factory = sqlite3.Row  # returns dict-like rows
-        self.connection.execute("PRAGMA journal_mode=WAL;")
-        self.connection.commit()
-        self.cursor = self.connection.cursor()
+
+        self.db_path = db_path
+        # One connection (and cursor) per thread: sqlite transactions are
+        # per connection, so sharing one would make concurrent BEGIN IMMEDIATE
+        # calls nest instead of contend. WAL lets the per-thread connections
+        # read while another writes.
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
 
         self.max_retries = 5
         self.retry_delay = 0.1  # seconds
 
+        # Open the calling thread's connection now so a bad path fails here
+        self.connection
+
+    @property
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # cached_statements keeps hot SQL compiled between calls (default is only 128)
+            # isolation_level=None leaves transaction control to us (see BEGIN IMMEDIATE below)
+            # check_same_thread=False only so close() can close every thread's connection
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256, isolation_level=None)
+            conn.row_factory = sqlite3.Row  # returns dict-like rows
+            conn.execute("PRAGMA journal_mode=WAL;")
+            # NORMAL skips the fsync per commit; under WAL this is still safe against
+            # process crashes, only a power loss can drop the very last transaction
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute("PRAGMA mmap_size=268435456;")   # read hot pages via mmap instead of read() calls
+            conn.execute("PRAGMA temp_store=MEMORY;")
+            conn.execute("PRAGMA cache_size=-65536;")     # 64MB page cache
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @property
+    def cursor(self):
+        cur = getattr(self._local, "cursor", None)
+        if cur is None:
+            cur = self.connection.cursor()
+            self._local.cursor = cur
+        return cur
+
     def execute_query(self, sql: str, params:list=[]) -> list[dict]:
         self.cursor.execute(sql, params)
-        rows = []
-        for row in self.cursor.fetchall():
-            rows.append(dict(row))
-        
-        return rows
+        return [dict(row) for row in self.cursor.fetchall()]
     
     def execute_write(self, sql: str, params:list=[]) -> int:
-        
+
+        cursor = self.cursor
         attempt = 0
         while attempt < self.max_retries:
             try:
-                self.cursor.execute(sql, params)
+                # Grab the reserved lock up front so the write can't stall mid-transaction
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(sql, params)
                 self.connection.commit()
                 break
 
-            # Check for database lock error and retry
             except sqlite3.OperationalError as e:
+                self.connection.rollback()
+                # Only a held lock is worth retrying, anything else is a real failure
+                if "database is locked" not in str(e):
+                    raise
                 attempt += 1
-                if "database is locked" in str(e):
-                    time.sleep(self.retry_delay)  # wait before retry
-        
+                time.sleep(self.retry_delay)  # wait before retry
+
         # Return the number of affected rows
-        affected = self.cursor.rowcount
+        affected = cursor.rowcount
         if affected == -1 or affected is None:
             return 0
         return affected
-    
+
+    def execute_many(self, sql: str, params_list:list=[]) -> int:
+
+        if not params_list:
+            return 0
+
+        cursor = self.cursor
+        attempt = 0
+        while attempt < self.max_retries:
+            try:
+                # Grab the reserved lock up front so the write can't stall mid-transaction
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.executemany(sql, params_list)
+                self.connection.commit()
+                break
+
+            except sqlite3.OperationalError as e:
+                self.connection.rollback()
+                # Only a held lock is worth retrying, anything else is a real failure
+                if "database is locked" not in str(e):
+                    raise
+                attempt += 1
+                time.sleep(self.retry_delay)  # wait before retry
+
+        # Return the number of affected rows
+        affected = cursor.rowcount
+        if affected == -1 or affected is None:
+            return 0
+        return affected
+
     def close(self) -> None:
-        try:
-            self.cursor.close()
-        finally:
-            self.connection.close()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
 
 
 
 
 class PostgresDatabase(Database):
     
-    def __init__(self, host: str, dbname: str, user: str, password: str, port: int = 5432):
+    def __init__(self, host: str, dbname: str, user: str, password: str, port: int = 5432, minconn: int = 2, maxconn: int = 25):
         if not all([host, dbname, user, password]):
             raise ValueError("All database connection parameters are required")
-        
+
+        # Kept so reset_pool can rebuild the pool after a fork
+        self._pool_kwargs = dict(
+            minconn=minconn,
+            maxconn=maxconn,
+            host=host,
+            dbname=dbname,
+            user=user,
+            password=password,
+            port=port,
+            connect_timeout=5
+        )
+
         try:
-            self.connection = psycopg2.connect(
-                host=host,
-                dbname=dbname,
-                user=user,
-                password=password,
-                port=port,
-                connect_timeout=5
-            )
-            self.connection.autocommit = True
-            self.cursor = self.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            
-            print(f"PostgreSQL database connection established: {user}@{host}:{port}/{dbname}")
+            # Pool of connections so concurrent webhook threads don't serialize on one connection
+            self.pool = psycopg2.pool.ThreadedConnectionPool(**self._pool_kwargs)
+
+            # Cache of prepared statements, keyed by SQL text
+            self._prepared = {}
+            # Per-thread pinned connection for connection_scope blocks
+            self._scoped = threading.local()
+
+            log.info("PostgreSQL connection pool established: %s@%s:%s/%s (%s-%s connections)", user, host, port, dbname, minconn, maxconn)
         except psycopg2.OperationalError as e:
-            print(f"Failed to connect to PostgreSQL database: {e}")
+            log.error("Failed to connect to PostgreSQL database: %s", e)
             raise
         except psycopg2.Error as e:
-            print(f"PostgreSQL error during initialization: {e}")
+            log.error("PostgreSQL error during initialization: %s", e)
             raise
         except Exception as e:
-            print(f"Unexpected error initializing PostgreSQL database: {e}")
+            log.exception("Unexpected error initializing PostgreSQL database")
             raise
 
+    def reset_pool(self) -> None:
+        '''
+        Drops every pooled connection and builds a fresh pool. Called from the
+        gunicorn post_fork hook: connections opened in the preloaded parent
+        can't be shared by forked workers.
+        '''
+        try:
+            self.pool.closeall()
+        except psycopg2.Error:
+            pass
+        self.pool = psycopg2.pool.ThreadedConnectionPool(**self._pool_kwargs)
+        log.info("PostgreSQL connection pool reset (pid %s)", os.getpid())
+
+    @contextmanager
+    def connection_scope(self):
+        '''
+        Pins one pooled connection to the calling thread for the duration of the
+        block, so a run of consecutive statements pays a single pool checkout
+        instead of one per call.
+        '''
+        conn = self.pool.getconn()
+        conn.autocommit = True
+        self._scoped.conn = conn
+        try:
+            yield
+        finally:
+            self._scoped.conn = None
+            self.pool.putconn(conn)
+
+    def _acquire(self):
+        '''Returns (conn, scoped). A scoped connection must not be returned to the pool by the caller.'''
+        conn = getattr(self._scoped, "conn", None)
+        if conn is not None:
+            return conn, True
+        return self.pool.getconn(), False
+
+    def _prepared_for(self, sql: str):
+        ''' Returns (name, prepare_sql, execute_sql) for this SQL, building the entry on first use. '''
+        entry = self._prepared.get(sql)
+        if entry is None:
+            name = f"stmt_{abs(hash(sql)):x}"
+            num_params = sql.count("%s")
+
+            # Translate %s placeholders to $1, $2, ... for PREPARE
+            parts = sql.split("%s")
+            dollar_sql = "".join(part + (f"${i + 1}" if i < num_params else "") for i, part in enumerate(parts))
+
+            if num_params > 0:
+                execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * num_params)})"
+            else:
+                execute_sql = f"EXECUTE {name}"
+
+            entry = (name, f"PREPARE {name} AS {dollar_sql}", execute_sql)
+            self._prepared[sql] = entry
+        return entry
+
+    def _execute(self, cursor, conn, sql: str, params) -> None:
+        '''
+        Runs sql through a server-side prepared statement so the parse/plan cost
+        is only paid the first time each connection sees it.
+        Falls back to a plain execute if the statement cannot be prepared.
+        '''
+        name, prepare_sql, execute_sql = self._prepared_for(sql)
+
+        # Prepared statements live per connection, so track what each one has seen
+        prepared_names = getattr(conn, "_prepared_names", None)
+        if prepared_names is None:
+            prepared_names = set()
+            conn._prepared_names = prepared_names
+
+        try:
+            if name not in prepared_names:
+                cursor.execute(prepare_sql)
+                prepared_names.add(name)
+            cursor.execute(execute_sql, params)
+        except psycopg2.Error:
+            prepared_names.discard(name)
+            cursor.execute(sql, params)
+
     def execute_query(self, sql: str, params: list = []) -> list[dict]:
         if not sql or not sql.strip():
-            print("execute_query called with empty SQL")
+            log.warning("execute_query called with empty SQL")
             return []
         
         # Make sure this is a read-only query
         if not sql.strip().lower().startswith("select") and not sql.strip().lower().startswith("with"):
-            print(f"execute_query called with non-SELECT statement: {sql[:50]}...")
+            log.warning("execute_query called with non-SELECT statement: %.50s...", sql)
             return []
-        
+
+        conn, scoped = self._acquire()
         try:
-            self.cursor.execute(sql, params)
-            results = self.cursor.fetchall()
-            return results
-        
+            conn.autocommit = True
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                self._execute(cursor, conn, sql, params)
+                results = cursor.fetchall()
+                return results
+
+        except psycopg2.Error as e:
+            log.error("PostgreSQL query error: %s\nSQL: %s\nParams: %s", e, sql, params)
+            return []
+        except Exception as e:
+            log.exception("Unexpected error executing query")
+            return []
+        finally:
+            if not scoped:
+                self.pool.putconn(conn)
+
+    def execute_query_nt(self, sql: str, params: list = []) -> list:
+        '''
+        Like execute_query but returns namedtuple rows instead of dicts.
+        Cheaper per row, meant for hot internal reads where the caller
+        accesses fields by attribute.
+        '''
+        if not sql or not sql.strip():
+            log.warning("execute_query_nt called with empty SQL")
+            return []
+
+        # Make sure this is a read-only query
+        if not sql.strip().lower().startswith("select") and not sql.strip().lower().startswith("with"):
+            log.warning("execute_query_nt called with non-SELECT statement: %.50s...", sql)
+            return []
+
+        conn, scoped = self._acquire()
+        try:
+            conn.autocommit = True
+            with conn.cursor(cursor_factory=psycopg2.extras.NamedTupleCursor) as cursor:
+                self._execute(cursor, conn, sql, params)
+                results = cursor.fetchall()
+                return results
+
         except psycopg2.Error as e:
-            print(f"PostgreSQL query error: {e}\nSQL: {sql}\nParams: {params}")
+            log.error("PostgreSQL query error: %s\nSQL: %s\nParams: %s", e, sql, params)
             return []
         except Exception as e:
-            print(f"Unexpected error executing query: {e}")
+            log.exception("Unexpected error executing query")
             return []
+        finally:
+            if not scoped:
+                self.pool.putconn(conn)
+
+    def execute_query_stream(self, sql: str, params: list = [], itersize: int = 500):
+        '''
+        Runs a read-only query through a server-side cursor and yields rows as
+        dicts, itersize at a time, so large result sets never sit fully in
+        memory on either end.
+        '''
+        if not sql or not sql.strip():
+            log.warning("execute_query_stream called with empty SQL")
+            return
+
+        # Make sure this is a read-only query
+        if not sql.strip().lower().startswith("select") and not sql.strip().lower().startswith("with"):
+            log.warning("execute_query_stream called with non-SELECT statement: %.50s...", sql)
+            return
+
+        conn = self.pool.getconn()
+        try:
+            # Named cursors only exist inside a transaction
+            conn.autocommit = False
+            with conn.cursor(name="stream_cursor", cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.itersize = itersize
+                cursor.execute(sql, params)
+                for row in cursor:
+                    yield row
+            conn.commit()
+
+        except psycopg2.Error as e:
+            log.error("PostgreSQL streaming query error: %s\nSQL: %s\nParams: %s", e, sql, params)
+            conn.rollback()
+        finally:
+            self.pool.putconn(conn)
 
     def execute_write(self, sql: str, params: list = []) -> int:
         if not sql or not sql.strip():
-            print("execute_write called with empty SQL")
+            log.warning("execute_write called with empty SQL")
             return 0
-        
+
+        conn, scoped = self._acquire()
         try:
-            self.cursor.execute(sql, params)
-            affected = self.cursor.rowcount
-            
+            conn.autocommit = True
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                self._execute(cursor, conn, sql, params)
+                affected = cursor.rowcount
+
             if affected == -1 or affected is None:
                 affected = 0
-            
+
             return affected
-        
+
         except psycopg2.IntegrityError as e:
-            print(f"Integrity constraint violation: {e}\nSQL: {sql}\nParams: {params}")
+            log.error("Integrity constraint violation: %s\nSQL: %s\nParams: %s", e, sql, params)
             return 0
-        
+
         except psycopg2.OperationalError as e:
-            print(f"PostgreSQL operational error (connection issue): {e}")
+            log.error("PostgreSQL operational error (connection issue): %s", e)
             return 0
-        
+
         except psycopg2.Error as e:
-            print(f"PostgreSQL write error: {e}\nSQL: {sql}\nParams: {params}")
+            log.error("PostgreSQL write error: %s\nSQL: %s\nParams: %s", e, sql, params)
             return 0
-        
+
+        except Exception as e:
+            log.exception("Unexpected error during write operation")
+            return 0
+        finally:
+            if not scoped:
+                self.pool.putconn(conn)
+
+    def execute_many(self, sql: str, params_list: list = []) -> int:
+        if not params_list:
+            return 0
+
+        conn, scoped = self._acquire()
+        try:
+            conn.autocommit = True
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                # execute_batch folds the rows into a handful of round trips
+                # instead of executemany's one per row
+                psycopg2.extras.execute_batch(cursor, sql, params_list, page_size=500)
+                affected = cursor.rowcount
+
+            if affected == -1 or affected is None:
+                affected = 0
+
+            return affected
+
+        except psycopg2.Error as e:
+            log.error("PostgreSQL batch write error: %s\nSQL: %s\nRows: %s", e, sql, len(params_list))
+            return 0
+
         except Exception as e:
-            print(f"Unexpected error during write operation: {e}")
+            log.exception("Unexpected error during batch write operation")
             return 0
+        finally:
+            if not scoped:
+                self.pool.putconn(conn)
 
     def close(self) -> None:
         try:
-            if self.cursor:
-                self.cursor.close()
-            if self.connection:
-                self.connection.close()
-            print("PostgreSQL connection closed successfully")
+            if self.pool:
+                self.pool.closeall()
+            log.info("PostgreSQL connection pool closed successfully")
         except psycopg2.Error as e:
-            print(f"Error closing PostgreSQL connection: {e}")
+            log.error("Error closing PostgreSQL connection pool: %s", e)
         except Exception as e:
-            print(f"Unexpected error closing connection: {e}")
\ No newline at end of file
+            log.exception("Unexpected error closing connection pool")
\ No newline at end of file
@@ -0,0 +1,30 @@
+
+# Shared gunicorn config for both apps:
+#   gunicorn -c gunicorn_conf.py webInterfaceApp:app
+#   gunicorn -c gunicorn_conf.py smsServiceApp:app
+import multiprocessing
+import sys
+
+workers = 2 * multiprocessing.cpu_count() + 1
+threads = 8
+
+# Import the app (and warm its caches) once in the master, fork workers from it.
+# Note that the scheduler is in-memory and per worker: recycling a worker drops
+# the session timers that worker armed.
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Neither connections nor threads survive fork(): each worker rebuilds its
+    # Postgres pool and restarts the log-flush and scheduler threads, which
+    # only ran in the preloaded master
+    for name in ("webInterfaceApp", "smsServiceApp"):
+        module = sys.modules.get(name)
+        if module is None:
+            continue
+        if hasattr(module, "logger"):
+            module.logger.reset_pool()
+            if hasattr(module.logger, "restart_flusher"):
+                module.logger.restart_flusher()
+        if hasattr(module, "scheduler"):
+            module.scheduler.restart_worker()
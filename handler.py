@@ -1,55 +1,94 @@
-from twilio.request_validator import RequestValidator
 from twilio.twiml.messaging_response import MessagingResponse
 from commands import CommandMapper
+from collections.abc import Mapping
+from dataclasses import dataclass
+import base64
+import hmac
+import logging
+
+log = logging.getLogger(__name__)
+
+
+# Parsed fields of an incoming Twilio message
+@dataclass(frozen=True, slots=True)
+class IncomingMessage:
+    body: str
+    from_number: str
+    to: str
+    sid: str
+    account_sid: str
+    num_media: int
 
 
 class TwilioHandler():
-    def __init__(self, command_mapper: CommandMapper, auth_token:str):
+    def __init__(self, command_mapper: CommandMapper, auth_token:str, validate_enabled:bool=False, public_url:str=""):
         self.command_mapper = command_mapper
-        self.validator = RequestValidator(auth_token)
-    
-    def _parse(self, form: dict) -> dict:
+        self.validate_enabled = validate_enabled
+        self._auth_token_bytes = auth_token.encode() if auth_token else b""
+        # The URL Twilio signs comes from deployment config, never from the
+        # inbound request (its Host header is client-controlled)
+        self._public_url_bytes = public_url.encode() if public_url else b""
+
+    def _parse(self, form: Mapping) -> IncomingMessage:
         """
         Parses a Twilio message.
-        Returns a dict of fields.
+        Returns an IncomingMessage of its fields.
         """
         body_raw = form.get("Body", "")
-        parced = {
-            "body": body_raw.strip(),
-            "from": form.get("From", ""),          
-            "to": form.get("To", ""),              
-            "sid": form.get("MessageSid", ""),
-            "account_sid": form.get("AccountSid", ""),
-            "num_media": int(form.get("NumMedia", "0") or 0),
-        }
+        parced = IncomingMessage(
+            body=body_raw.strip(),
+            from_number=form.get("From", ""),
+            to=form.get("To", ""),
+            sid=form.get("MessageSid", ""),
+            account_sid=form.get("AccountSid", ""),
+            num_media=int(form.get("NumMedia", "0") or 0),
+        )
 
         return parced
 
-    def validate_request(self, public_url: str, form_params: dict, signature: str) -> bool:
-        return self.validator.validate(public_url, form_params, signature)
-    
+    def validate_request(self, form_params: Mapping, signature: str) -> bool:
+        '''
+        Checks the X-Twilio-Signature for this request: base64(HMAC-SHA1) over the
+        configured public URL followed by the sorted form keys and values. Building
+        the signing bytes in one bytearray avoids the per-request string
+        concatenation the Twilio helper does.
+        '''
+        if not signature or not self._public_url_bytes:
+            return False
+
+        buf = bytearray(self._public_url_bytes)
+        for key in sorted(form_params):
+            buf += key.encode()
+            buf += str(form_params[key]).encode()
+
+        expected = base64.b64encode(hmac.new(self._auth_token_bytes, bytes(buf), "sha1").digest())
+        return hmac.compare_digest(expected, signature.encode())
 
-    def handle_incoming(self, public_url: str, form: dict, signature: str) -> str:
+
+    def handle_incoming(self, form: Mapping, signature: str) -> str:
         '''
         Validates and runs the registered method for an incoming SMS/MMS message from Twilio.
+        Accepts any Mapping, so request.form can be passed without copying it to a dict.
         '''
-        # Make sure the request is actually from Twilio
-        ##if not self.validate_request(public_url, form, signature):
-        ##   return self.send_reply("Unauthorized request.")
-            
+        # Make sure the request is actually from Twilio (short-circuits when validation is off)
+        if self.validate_enabled and not self.validate_request(form, signature):
+            return str(MessagingResponse())
+
         # Extract the command from the message
         message = self._parse(form)
-        body = message.get("body", "")
-        print(f"Received message: {body}")
-        if body != None:
-            parts = body.split()
-            cmd = parts[0].strip().lower()
+        body = message.body
+        log.debug("Received message: %s", body)
+        reply = None
+        if body:
+            # Tokenize the command word once, execute reuses it as-is.
+            # split() so a newline after the command still counts (multi-line SMS)
+            cmd = body.split(maxsplit=1)[0].lower()
 
             if self.command_mapper.command_exists(cmd) or self.command_mapper.has_default():
-                reply_ph_number = message.get("from", "")
-                message_sent = message.get("body", "")
-                self.command_mapper.execute(cmd, reply_ph_number, message_sent)
+                reply = self.command_mapper.execute(body, message.from_number, body, cmd=cmd)
 
-        # Return empty response
+        # Carry the reply back in the webhook response instead of a second REST call
         resp = MessagingResponse()
+        if reply:
+            resp.message(reply)
         return str(resp)
\ No newline at end of file
@@ -1,6 +1,86 @@
 from database import PostgresDatabase
 from abc import ABC, abstractmethod
 from datetime import datetime, timezone
+import atexit
+import logging
+import queue
+import re
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+# SQL for the per-SMS hot path, named once at module level. Each constant is a
+# single stable string, so the prepared-statement cache in PostgresDatabase
+# sees the exact same key on every call.
+SQL_GET_USER_BY_PHONE_KEY = '''
+    SELECT * FROM users
+    WHERE phone_number_key = %s
+    '''
+
+SQL_GET_USER_BY_PHONE = '''
+    SELECT * FROM users
+    WHERE phone_number = %s
+    '''
+
+SQL_GET_USER_BY_ID = '''
+    SELECT * FROM users
+    WHERE id = %s
+    '''
+
+SQL_INSERT_SESSION = '''
+    INSERT INTO sessions (user_id, started_at, status, last_check_in_at)
+    VALUES (%s, NOW(), 'active', NOW())
+    '''
+
+SQL_GET_ACTIVE_SESSION = '''
+    SELECT * FROM sessions
+    WHERE status = 'active' AND user_id = %s
+    '''
+
+SQL_CHECK_IN_SESSION = '''
+    UPDATE sessions
+    SET last_check_in_at = NOW()
+    WHERE id = %s
+    '''
+
+SQL_LOG_USER_MESSAGE = '''
+    INSERT INTO message_logs (user_id, message_text, direction, timestamp)
+    VALUES (%s, %s, %s, NOW())
+    '''
+
+SQL_LOG_CONTACT_MESSAGE = '''
+    INSERT INTO message_logs (contact_id, message_text, direction, timestamp)
+    VALUES (%s, %s, %s, NOW())
+    '''
+
+# Shared by the list and streaming variants of the all-users lookup
+SQL_ALL_USERS = '''
+    SELECT
+    u.id AS user_id,
+    u.first_name,
+    u.last_name,
+    u.phone_number,
+    s.status AS status,
+    s.last_check_in_at
+    FROM users u
+    LEFT JOIN LATERAL (
+    SELECT *
+    FROM sessions
+    WHERE user_id = u.id
+    ORDER BY last_check_in_at DESC NULLS LAST
+    LIMIT 1
+    ) s ON TRUE
+    ORDER BY
+    CASE s.status
+        WHEN 'alert' THEN 1
+        WHEN 'active' THEN 2
+        WHEN 'inactive' THEN 3
+        ELSE 4   -- for NULL or unexpected statuses
+    END,
+    u.first_name
+    '''
 
 class Logger(ABC):
     # -------------- User Methods --------------#
@@ -39,18 +119,10 @@ class Logger(ABC):
 
     # -------------- Session Methods --------------#
     @abstractmethod
-    def active_session_exists(self, user_id: str) -> bool:
-        '''Checks if the user with this user_id has an ongoing active session (i.e. are working alone).'''
-        pass
-    @abstractmethod
     def start_session(self, user_id: str) -> str | None:
         '''Starts a new WORK-ALONE session for the user with the given user_id.'''
         pass
     @abstractmethod
-    def is_active_session(self, session_id:str) -> bool:
-        '''Returns true if the session with the given session_id is active. Otherwise returns false.'''
-        pass
-    @abstractmethod
     def get_active_session(self, user_id: str) -> dict | None:
         '''Gets the active session for this user, if they are not currently in an active session returns None.'''
         pass
@@ -63,6 +135,10 @@ class Logger(ABC):
         '''Use this for a System ended session, for cases when the user will not respond and Escalation Contacts were notified.'''
         pass
     @abstractmethod
+    def end_all_active_sessions(self, user_id: str, new_status:str="inactive") -> int:
+        '''Closes every active session for this user in one write. Returns the number of sessions closed.'''
+        pass
+    @abstractmethod
     def check_in_session(self, session_id: str) -> None:
         '''Call when a user checks in with the system. Updates the last checked_in_at field for a user.'''
         pass
@@ -71,6 +147,10 @@ class Logger(ABC):
         '''Gets the users most recent session, no matter what its status is.'''
         pass
     @abstractmethod
+    def get_session_status(self, session_id:str) -> dict | None:
+        '''Gets the session's user, status and minutes since its last check-in in one query.'''
+        pass
+    @abstractmethod
     def deescalate_session(self, contact_id:str, session_id:str) -> None:
         '''Sets a session as deescalated by a given contact.'''
         pass
@@ -123,36 +203,99 @@ class Logger(ABC):
 
 
 
+# Small thread-safe cache where entries expire after a fixed TTL
+class _TTLCache:
+    def __init__(self, maxsize:int=2048, ttl:float=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._entries = {}  # key -> (expires_at, value)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.time() > expires_at:
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            if len(self._entries) >= self.maxsize:
+                # Drop expired entries first, then oldest, to stay bounded
+                now = time.time()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                while len(self._entries) >= self.maxsize:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.time() + self.ttl, value)
+
+    def pop(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
 class PostgresLogger:
-    def __init__(self, host: str, dbname: str, user: str, password: str, port: int = 5432):
-        self.db = PostgresDatabase(host=host, dbname=dbname, user=user, password=password, port=port)
-        self.active_sessions = {}
+    def __init__(self, host: str, dbname: str, user: str, password: str, port: int = 5432, minconn: int = 4, maxconn: int = 32):
+        # PostgresDatabase owns the connection pool; every logger method acquires
+        # and releases a pooled connection per query through it
+        self.db = PostgresDatabase(host=host, dbname=dbname, user=user, password=password, port=port, minconn=minconn, maxconn=maxconn)
+        # Users change rarely but are looked up on every SMS and scheduler tick
+        self.user_cache = _TTLCache(maxsize=2048, ttl=60)
+        # Which user a contact belongs to only changes when the contact is
+        # deleted, so this can sit in cache longer
+        self.contact_user_cache = _TTLCache(maxsize=2048, ttl=300)
+        # contact phone number -> ids of the users they cover, so an inbound
+        # contact SMS doesn't re-join users against escalation_contacts
+        self._contact_phone_to_users = {}
+        self._reload_contact_map()
+
+    def pipeline(self):
+        '''
+        Context manager that runs the enclosed logger calls on one pinned
+        connection, for endpoints that issue several statements back to back.
+        '''
+        return self.db.connection_scope()
+
+    def reset_pool(self) -> None:
+        '''Rebuilds the connection pool after a fork (see gunicorn_conf.post_fork).'''
+        self.db.reset_pool()
 
     #-------------- User Methods --------------#
     def user_exists(self, phone_number:str="", user_id:str="") -> bool:
         return self.get_user(phone_number=phone_number, user_id=user_id) is not None
 
     def get_user(self, phone_number:str="", user_id:str="") -> dict | None:
-        result = None
+
+        # Serve repeat lookups straight from the cache
         if phone_number != "":
-            result = self.db.execute_query(
-                '''
-                SELECT * FROM users 
-                WHERE phone_number = %s
-                ''',
+            phone_key = _normalize_phone(phone_number)
+            cached = self.user_cache.get(("phone", phone_key))
+            if cached is not None:
+                return cached
+        elif user_id != "":
+            cached = self.user_cache.get(("id", user_id))
+            if cached is not None:
+                return cached
 
-                [phone_number]
-            )
+        result = None
+        if phone_number != "":
+            # Probe by the fixed-width key instead of comparing TEXT
+            result = self.db.execute_query(SQL_GET_USER_BY_PHONE_KEY, [phone_key])
+            if not result:
+                # Rows from before the key column existed (or not yet
+                # backfilled) still answer by the raw number
+                result = self.db.execute_query(SQL_GET_USER_BY_PHONE, [phone_number])
         elif user_id != "":
-            result = self.db.execute_query(
-                '''
-                SELECT * FROM users
-                WHERE id = %s
-                ''',
-                [user_id]
-            )
+            result = self.db.execute_query(SQL_GET_USER_BY_ID, [user_id])
         if result:
-            return result[0]
+            user = result[0]
+            # Cache under both keys so phone and id lookups hit
+            self.user_cache.set(("phone", _normalize_phone(user.get("phone_number") or "")), user)
+            self.user_cache.set(("id", user.get("id")), user)
+            return user
         return None
     
     def create_user(self, phone_number:str, first_name:str, last_name:str, delay_minutes:int=30) -> str|None:
@@ -160,12 +303,15 @@ class PostgresLogger:
         # Create a new user in the db
         affected = self.db.execute_write(
             '''
-            INSERT INTO users (phone_number, first_name, last_name, delay_interval)
-            VALUES (%s, %s, %s, %s)
+            INSERT INTO users (phone_number, phone_number_key, first_name, last_name, delay_interval)
+            VALUES (%s, %s, %s, %s, %s)
             ''',
-            [phone_number, first_name, last_name, delay_minutes]
+            [phone_number, _normalize_phone(phone_number), first_name, last_name, delay_minutes]
         )
 
+        # Don't let a stale miss linger for this number
+        self.user_cache.pop(("phone", _normalize_phone(phone_number)))
+
         # Fetch the newly created user
         if affected > 0:
             user = self.get_user(phone_number=phone_number)
@@ -175,42 +321,55 @@ class PostgresLogger:
     
     def update_user(self, user_id:str, first_name:str=None, last_name:str=None, phone_number:str=None, delay_minutes:int=None) -> None:
 
-        # Make sure this user exists
-        user = self.get_user(user_id=user_id)
-        if user is None:    
-            return
-        
-        _first_name = first_name if first_name is not None else user.get("first_name")
-        _last_name = last_name if last_name is not None else user.get("last_name")
-        _phone_number = phone_number if phone_number is not None else user.get("phone_number")
-        _delay_minutes = delay_minutes if delay_minutes is not None else user.get("delay_interval")
-
+        # One COALESCE update replaces the fetch-then-update pair;
+        # zero affected rows just means the user didn't exist
         affected = self.db.execute_write(
             '''
             UPDATE users
-            SET first_name=%s, last_name=%s, phone_number=%s, delay_interval=%s
+            SET first_name=COALESCE(%s, first_name),
+            last_name=COALESCE(%s, last_name),
+            phone_number=COALESCE(%s, phone_number),
+            phone_number_key=COALESCE(%s, phone_number_key),
+            delay_interval=COALESCE(%s, delay_interval)
             WHERE id = %s
 
             ''',
-            [_first_name, _last_name, _phone_number, _delay_minutes, user_id]
+            [first_name, last_name, phone_number, _normalize_phone(phone_number) if phone_number is not None else None, delay_minutes, user_id]
         )
 
-    
+        # Drop any cached copy of this user (including the one under its old number)
+        cached = self.user_cache.get(("id", user_id))
+        if cached is not None:
+            self.user_cache.pop(("phone", _normalize_phone(cached.get("phone_number") or "")))
+        self.user_cache.pop(("id", user_id))
+        if phone_number is not None:
+            self.user_cache.pop(("phone", _normalize_phone(phone_number)))
+
+
     def get_last_check_in(self, user_id: str) -> int | None:
-        rows = self.db.execute_query(
+        # Namedtuple rows, the single value doesn't need a dict.
+        # ORDER BY + LIMIT 1 walks the (user_id, last_check_in_at) index to the
+        # newest row instead of aggregating every session the user ever had
+        rows = self.db.execute_query_nt(
             '''
-            SELECT MAX(last_check_in_at) AS last_check 
-            FROM sessions 
+            SELECT last_check_in_at AS last_check
+            FROM sessions
             WHERE user_id = %s
+            ORDER BY last_check_in_at DESC NULLS LAST
+            LIMIT 1
             ''',
             [user_id]
         )
 
-        if not rows or rows[0]["last_check"] is None:
-            return None   
+        if not rows or rows[0].last_check is None:
+            return None
 
-        last_check = rows[0]["last_check"]
-        now = datetime.now()
+        last_check = rows[0].last_check
+        if last_check.tzinfo is not None:
+            # Aware timestamp (timestamptz column) needs an aware "now"
+            now = datetime.now(timezone.utc)
+        else:
+            now = datetime.now()
 
         diff = now - last_check
         minutes = int(diff.total_seconds() / 60)
@@ -218,68 +377,48 @@ class PostgresLogger:
 
 
     def get_all_users(self) -> list | None:
+        result = self.db.execute_query(SQL_ALL_USERS)
+        if result:
+            return result
+        return None
+
+    def stream_all_users(self):
+        '''Yields the get_all_users rows one at a time through a server-side cursor.'''
+        return self.db.execute_query_stream(SQL_ALL_USERS)
+
+    def get_user_with_status(self, user_id:str) -> dict | None:
+        # One lateral join replaces the user fetch + most-recent-session pair,
+        # same shape as get_all_users
         result = self.db.execute_query(
             '''
-            SELECT 
-            u.id AS user_id,
-            u.first_name,
-            u.last_name,
-            u.phone_number,
-            s.status AS status,
-            s.last_check_in_at
+            SELECT
+            u.*,
+            COALESCE(s.status, 'inactive') AS status
             FROM users u
             LEFT JOIN LATERAL (
-            SELECT *
+            SELECT status
             FROM sessions
             WHERE user_id = u.id
-            ORDER BY last_check_in_at DESC NULLS LAST
+            ORDER BY started_at DESC
             LIMIT 1
-        ) s ON TRUE  
-        ORDER BY 
-        CASE s.status
-            WHEN 'alert' THEN 1
-            WHEN 'active' THEN 2
-            WHEN 'inactive' THEN 3
-            ELSE 4   -- for NULL or unexpected statuses
-        END,
-        u.first_name;
-
-            '''
+            ) s ON TRUE
+            WHERE u.id = %s
+            ''',
+            [user_id]
         )
         if result:
-            return result
+            return result[0]
         return None
 
-    def get_user_with_status(self, user_id:str) -> dict | None:
-        user = self.get_user(user_id=user_id)
-        if user is None:
-            return None
-        mostRecentSession = self.get_most_recent_session(user_id=user_id)
-        if mostRecentSession is None:
-            user["status"] = "inactive"
-        if mostRecentSession:       
-            user["status"] = mostRecentSession.get("status", "inactive")
-        
-        return user
-
 
     #-------------- Session Methods --------------#
-    def active_session_exists(self, user_id: str) -> bool:
-        return self.get_active_session(user_id=user_id) is not None
-
     def start_session(self, user_id: str) -> str | None:
 
         if self.user_exists(user_id=user_id) == False:
             return
-        
+
         # Create a new session entry in the database
-        affected = self.db.execute_write(
-            '''
-            INSERT INTO sessions (user_id, started_at, status, last_check_in_at) 
-            VALUES (%s, NOW(), 'active', NOW())
-            ''',
-            [user_id]
-        )
+        affected = self.db.execute_write(SQL_INSERT_SESSION, [user_id])
 
         # Get the session ID of the newly created session
         if affected > 0:
@@ -288,31 +427,9 @@ class PostgresLogger:
                 return session.get("id")
 
         return None
-    
-    def is_active_session(self, session_id: str) -> bool:
-        result = self.db.execute_query(
-            '''
-            SELECT * FROM sessions 
-            WHERE id = %s 
-            ''',
-            [session_id]
-        )
-        if result:
-            print("in is_active_session")
-            print(result)
-            if result != None:
-                return result[0].get("status") == "active"
-
-        return None
 
     def get_active_session(self, user_id: str) -> dict | None:
-        result = self.db.execute_query(
-            '''
-            SELECT * FROM sessions 
-            WHERE status = 'active' AND user_id = %s 
-            ''',
-            [user_id]
-        )
+        result = self.db.execute_query(SQL_GET_ACTIVE_SESSION, [user_id])
         if result:
             return result[0]
 
@@ -334,6 +451,29 @@ class PostgresLogger:
 
         return None
     
+    def get_session_status(self, session_id:str) -> dict | None:
+
+        # One JOIN covers what used to be three SELECTs per scheduler tick
+        result = self.db.execute_query(
+            '''
+            SELECT
+            u.id AS user_id,
+            u.first_name,
+            u.last_name,
+            u.phone_number,
+            u.delay_interval,
+            s.status,
+            EXTRACT(EPOCH FROM (NOW() - s.last_check_in_at)) / 60 AS minutes_since_check_in
+            FROM sessions s
+            JOIN users u ON u.id = s.user_id
+            WHERE s.id = %s
+            ''',
+            [session_id]
+        )
+        if result:
+            return result[0]
+        return None
+
     def end_session(self, session_id: str) -> None:
 
         if session_id is None:
@@ -348,7 +488,7 @@ class PostgresLogger:
             """,
             ["inactive", session_id]
         )
-    
+
     def timeout_session(self, session_id: str) -> None:
 
         if session_id is None:
@@ -363,23 +503,41 @@ class PostgresLogger:
             """,
             ["alert", session_id]
         )
-    
-    def check_in_session(self, session_id: str) -> None:
 
-        if session_id is None:
-            return
+    def end_all_active_sessions(self, user_id: str, new_status:str="inactive") -> int:
 
-        # Update the session entry in the database
+        # Close every active session in a single update instead of one query per session
         affected = self.db.execute_write(
             """
             UPDATE sessions
-            SET last_check_in_at = NOW()
-            WHERE id = %s
+            SET ended_at = NOW(), status = %s, last_check_in_at = NOW()
+            WHERE user_id = %s AND status = 'active'
             """,
-            [session_id]
+            [new_status, user_id]
         )
+        return affected
+
+    def check_in_session(self, session_id: str) -> None:
+
+        if session_id is None:
+            return
+
+        # Update the session entry in the database
+        affected = self.db.execute_write(SQL_CHECK_IN_SESSION, [session_id])
 
     #------------ Escalation Contact Methods ------------#
+    def _reload_contact_map(self) -> None:
+        '''Rebuilds the contact-phone -> user-ids map from the table.'''
+        rows = self.db.execute_query_nt(
+            '''
+            SELECT phone_number, contact_of FROM escalation_contacts
+            '''
+        )
+        contact_map = {}
+        for row in rows:
+            contact_map.setdefault(row.phone_number, []).append(row.contact_of)
+        self._contact_phone_to_users = contact_map
+
     def get_escalation_contact(self, user_id:str=None, contact_phone_num:str=None, contact_id:str=None):
 
         if contact_id is not None:
@@ -422,11 +580,6 @@ class PostgresLogger:
     
     def add_escalation_contact(self, user_id: str, first_name:str, last_name:str, phone_number:str) -> str | None:
 
-        # Make sure user exists
-        user = self.get_user(user_id=user_id)
-        if user is None:
-            return 
-
         # Make sure phone number is valid
         if not _validate_phone_number(phone_number):
             return
@@ -435,14 +588,18 @@ class PostgresLogger:
         #if user.get("phone_number", "") == phone_number:
         #    return
 
+        # The user-existence check rides along with the insert:
+        # no matching user means nothing gets inserted
         affected = self.db.execute_write(
             '''
             INSERT INTO escalation_contacts (contact_of, first_name, last_name, phone_number)
-            VALUES (%s, %s, %s, %s)
+            SELECT %s, %s, %s, %s
+            WHERE EXISTS (SELECT 1 FROM users WHERE id = %s)
             ''',
-            [user_id, first_name, last_name, phone_number]
+            [user_id, first_name, last_name, phone_number, user_id]
         )
         if affected > 0:
+            self._contact_phone_to_users.setdefault(phone_number, []).append(user_id)
             return "Success"
         return None
     
@@ -454,29 +611,36 @@ class PostgresLogger:
             ''',
             [contact_id]
         )
+        self.contact_user_cache.pop(contact_id)
+        # Contact changes are rare admin actions, one SELECT keeps the map exact
+        self._reload_contact_map()
     
     def update_escalation_contact(self, contact_id: str, first_name:str=None, last_name:str=None, phone_number:str=None) -> None:
 
-        # Make sure this contact exists
-        contact = self.get_escalation_contact(contact_id=contact_id)
-        if contact is None:    
-            return
-        
-        _first_name = first_name if first_name is not None else contact.get("first_name")
-        _last_name = last_name if last_name is not None else contact.get("last_name")
-        _phone_number = phone_number if phone_number is not None else contact.get("phone_number")
-
+        # One COALESCE update replaces the fetch-then-update pair;
+        # zero affected rows just means the contact didn't exist
         affected = self.db.execute_write(
             '''
             UPDATE escalation_contacts
-            SET first_name=%s, last_name=%s, phone_number=%s
+            SET first_name=COALESCE(%s, first_name),
+            last_name=COALESCE(%s, last_name),
+            phone_number=COALESCE(%s, phone_number)
             WHERE id = %s
 
             ''',
-            [_first_name, _last_name, _phone_number, contact_id]
+            [first_name, last_name, phone_number, contact_id]
         )
+        if phone_number is not None:
+            # The old number's map entry has to go, easiest to rebuild
+            self._reload_contact_map()
     
     def get_escalation_contacts_user(self, contact_id: str) -> dict | None:
+
+        # This runs for every inbound contact SMS, so serve repeats from cache
+        cached = self.contact_user_cache.get(contact_id)
+        if cached is not None:
+            return cached
+
         result = self.db.execute_query(
             '''
             SELECT contact_of FROM escalation_contacts
@@ -485,36 +649,60 @@ class PostgresLogger:
             [contact_id]
         )
         if result:
+            self.contact_user_cache.set(contact_id, result[0])
             return result[0]
         return None
     
     def get_recent_timeouts_for_contact(self, contact_id) -> list | None:
-        result = self.db.execute_query(
-            '''
-            WITH mostRecentIsTimeout as (
-            SELECT DISTINCT ON (user_id)
-            id AS session_id,
-            user_id,
-            last_check_in_at,
-            status
-            FROM sessions
-            WHERE status = 'alert'
-            ORDER BY user_id, last_check_in_at DESC),
-
-            isContactOf AS (
-            SELECT 
-            users.id as user_id FROM 
-            users join escalation_contacts as ec
-            on users.id = ec.contact_of
-            WHERE ec.phone_number = %s)
-
-            SELECT session_id, isContactOf.user_id, last_check_in_at, status FROM mostRecentIsTimeout JOIN isContactOf
-            ON mostRecentIsTimeout.user_id = isContactOf.user_id
-            ''',
-            [contact_id]
-        )
+
+        # The phone -> users map answers "who do they cover" without touching
+        # the DB. A miss is not proof the number is unknown - contacts are
+        # edited by the web app in another process - so misses go to the
+        # full join instead of short-circuiting
+        user_ids = self._contact_phone_to_users.get(contact_id)
+        if not user_ids:
+            result = self.db.execute_query(
+                '''
+                SELECT DISTINCT ON (s.user_id)
+                s.id AS session_id,
+                s.user_id,
+                u.first_name,
+                u.last_name,
+                s.last_check_in_at,
+                s.status
+                FROM sessions s
+                JOIN users u ON u.id = s.user_id
+                JOIN escalation_contacts ec ON ec.contact_of = s.user_id
+                WHERE ec.phone_number = %s AND s.status = 'alert'
+                ORDER BY s.user_id, s.last_check_in_at DESC
+                ''',
+                [contact_id]
+            )
+        else:
+            # The EXISTS re-checks membership so a stale map hit (the contact
+            # was deleted by the web app since this process loaded the map)
+            # can't return users the sender no longer covers
+            result = self.db.execute_query(
+                '''
+                SELECT DISTINCT ON (s.user_id)
+                s.id AS session_id,
+                s.user_id,
+                u.first_name,
+                u.last_name,
+                s.last_check_in_at,
+                s.status
+                FROM sessions s
+                JOIN users u ON u.id = s.user_id
+                WHERE s.user_id = ANY(%s) AND s.status = 'alert'
+                AND EXISTS (
+                    SELECT 1 FROM escalation_contacts ec
+                    WHERE ec.contact_of = s.user_id AND ec.phone_number = %s
+                )
+                ORDER BY s.user_id, s.last_check_in_at DESC
+                ''',
+                [user_ids, contact_id]
+            )
         if result:
-            print(result)
             return result
         return None
     
@@ -532,27 +720,109 @@ class PostgresLogger:
 
     # -------------- Message Methods --------------#
     def log_user_message(self, user_id: str, message: str, direction: str) -> None:
-        affected = self.db.execute_write(
-            '''
-            INSERT INTO message_logs (user_id, message_text, direction, timestamp)
-            VALUES (%s, %s, %s, NOW())
-            ''',
-            [user_id, message, direction]
-        )
-    
+        affected = self.db.execute_write(SQL_LOG_USER_MESSAGE, [user_id, message, direction])
+
     def log_contact_message(self, contact_id: str, message: str, direction: str) -> None:
-        affected = self.db.execute_write(
-            '''
-            INSERT INTO message_logs (contact_id, message_text, direction, timestamp)
-            VALUES (%s, %s, %s, NOW())
-            ''',
-            [contact_id, message, direction]
-        )
+        affected = self.db.execute_write(SQL_LOG_CONTACT_MESSAGE, [contact_id, message, direction])
+
+    def log_user_messages(self, rows: list) -> None:
+        '''Logs a batch of user messages in one write. Each row is [user_id, message, direction].'''
+        affected = self.db.execute_many(SQL_LOG_USER_MESSAGE, rows)
+
+    def log_contact_messages(self, rows: list) -> None:
+        '''Logs a batch of contact messages in one write. Each row is [contact_id, message, direction].'''
+        affected = self.db.execute_many(SQL_LOG_CONTACT_MESSAGE, rows)
+
+
+
+# Wraps a Logger and batches message log writes so commands don't wait on an INSERT per message
+class BatchedLogger:
+    '''
+    Queues log_user_message / log_contact_message calls and flushes them in
+    batches from a background thread, so the SMS hot path never waits on a
+    log commit. All other Logger methods pass straight through.
+    '''
+    def __init__(self, logger, max_batch:int=100, flush_interval:float=0.2):
+        self.logger = logger
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue()
+
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+        # Make sure anything still queued gets written on shutdown
+        atexit.register(self.flush)
+
+    def __getattr__(self, name):
+        # Everything that isn't a message log call goes straight to the wrapped logger
+        return getattr(self.logger, name)
+
+    def restart_flusher(self) -> None:
+        '''
+        Starts a fresh flush thread if the current one is gone. Needed after a
+        fork: the parent's thread doesn't exist in the child, so without this
+        the queue would fill and never be written.
+        '''
+        if not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
 
+    def log_user_message(self, user_id: str, message: str, direction: str) -> None:
+        self.pending.put(("user", [user_id, message, direction]))
 
+    def log_contact_message(self, contact_id: str, message: str, direction: str) -> None:
+        self.pending.put(("contact", [contact_id, message, direction]))
+
+    def flush(self) -> None:
+        '''Synchronously writes out everything currently queued.'''
+        batch = []
+        while True:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        self._write_batch(batch)
+
+    def _flush_loop(self):
+        while True:
+            # Block until there is something to log
+            batch = [self.pending.get()]
+
+            # Gather more entries until the batch is full or the interval passes
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: list) -> None:
+        user_rows = [params for kind, params in batch if kind == "user"]
+        contact_rows = [params for kind, params in batch if kind == "contact"]
+        if user_rows:
+            self.logger.log_user_messages(user_rows)
+        if contact_rows:
+            self.logger.log_contact_messages(contact_rows)
+
+
+
+def _normalize_phone(phone_number: str) -> int | None:
+    '''Strips formatting and returns the digits of a phone number as an int. None if there are no digits.'''
+    digits = "".join(ch for ch in phone_number if ch.isdigit())
+    return int(digits) if digits else None
+
+# A "+" followed by at least nine digits; one regex pass instead of
+# startswith + a slice copy + a second isdigit scan
+_PHONE_RE = re.compile(r"^\+\d{9,}$")
 
 def _validate_phone_number(phone_number: str) -> bool:
-    return phone_number.startswith("+") and len(phone_number) >= 10 and phone_number[1:].isdigit()
+    return _PHONE_RE.match(phone_number) is not None
 
 def _to_minutes(time:datetime):
     seconds = int(time.total_seconds())
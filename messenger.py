@@ -1,6 +1,13 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
 
+log = logging.getLogger(__name__)
+
 # Abstract Messenger class that defines the interface all messengers should implement
 class Messenger(ABC):
     @abstractmethod
@@ -12,15 +19,46 @@ class Messenger(ABC):
         """Make a voice call to a recipient."""
         pass
 
+# Logs any error from a finished send/call future
+def _log_send_failure(future):
+    error = future.exception()
+    if error is not None:
+        log.error("Twilio request failed: %s", error)
+
+
  # Implementation of Messenger for Twilio, allows you to send SMS/MMS messages
 class TwilioMessenger(Messenger):
     def __init__(self, account_sid:str, auth_token:str, default_from:str):
-        self.twilio_client = Client(account_sid, auth_token)
+        # Share one keep-alive session across all sends, sized for the worker
+        # pool below, so bursts reuse TLS connections instead of handshaking.
+        # TwilioHttpClient has no session kwarg, so swap its session after
+        # construction
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        http_client = TwilioHttpClient()
+        http_client.session = session
+        self.twilio_client = Client(account_sid, auth_token, http_client=http_client)
         self.from_number = default_from
+        # Worker pool so outbound Twilio HTTP calls don't block the webhook response
+        self._executor = ThreadPoolExecutor(max_workers=16)
 
-    def send_message(self, to: str, text: str) -> str:
+    def send_message(self, to: str, text: str):
+        '''Queues the message for sending and returns a Future for the SID.'''
+        future = self._executor.submit(self._send_message_sync, to, text)
+        future.add_done_callback(_log_send_failure)
+        return future
+
+    def make_call(self, to: str, message: str):
+        '''Queues the call and returns a Future for the SID.'''
+        future = self._executor.submit(self._make_call_sync, to, message)
+        future.add_done_callback(_log_send_failure)
+        return future
+
+    def _send_message_sync(self, to: str, text: str) -> str:
         if not to.startswith("+1") or len(to) != 11:
-            print("Invalid number format:", to)
+            log.warning("Invalid number format: %s", to)
             return ""  # Invalid number format
         message = self.twilio_client.messages.create(
             body=text,
@@ -29,15 +67,15 @@ class TwilioMessenger(Messenger):
         )
         return message.sid
 
-    def make_call(self, to: str, message: str) -> str:
+    def _make_call_sync(self, to: str, message: str) -> str:
         if not to.startswith("+1") or len(to) != 11:
-            print("Invalid number format for call:", to)
+            log.warning("Invalid number format for call: %s", to)
             return ""  # Invalid number format
         call = self.twilio_client.calls.create(
             twiml=f"<Response><Say>{message}</Say></Response>",
             from_=self.from_number,
             to=to
-            
+
         )
         return call.sid
-    
+
@@ -1,13 +1,94 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable
-import datetime
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+#
+# Schedules one-shot and repeating callbacks for session timeouts.
+#
+# The workload is thousands of small "fire in N minutes" jobs, so this is a
+# plain min-heap of (run_at, seq, ...) tuples ordered by run time, with one
+# worker thread sleeping until the next deadline. Each scheduled job costs a
+# tuple and an O(log n) push instead of a full jobstore entry.
+#
 
 
 class Scheduler:
-    def __init__(self):
-        self.scheduler = BackgroundScheduler()
-        self.scheduler.start()
+    def __init__(self, max_workers:int=8):
+        self._heap = []              # (run_at, seq, job_id, func, interval_seconds)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        # job_id -> seq of its current entry; a popped entry whose seq no
+        # longer matches was cancelled or replaced and is skipped
+        self._live = {}
+
+        # Jobs run on the executor so a slow callback can't delay the next deadline
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
 
     def schedule_job(self, func:Callable, run_in_minutes:int):
-        run_at = datetime.datetime.now() + datetime.timedelta(minutes=run_in_minutes)
-        self.scheduler.add_job(func, 'date', run_date=run_at)
+        run_at = time.monotonic() + run_in_minutes * 60
+        with self._cond:
+            heapq.heappush(self._heap, (run_at, next(self._seq), None, func, None))
+            self._cond.notify()
+
+    def schedule_repeating(self, job_id, func:Callable, interval_minutes:int):
+        '''Runs func every interval_minutes until cancelled. Only one job per job_id.'''
+        interval = interval_minutes * 60
+        with self._cond:
+            seq = next(self._seq)
+            # Registering the new seq implicitly drops any earlier entry for this id
+            self._live[str(job_id)] = seq
+            heapq.heappush(self._heap, (time.monotonic() + interval, seq, str(job_id), func, interval))
+            self._cond.notify()
+
+    def cancel(self, job_id):
+        '''Removes the repeating job with this id, if it is still scheduled.'''
+        with self._cond:
+            self._live.pop(str(job_id), None)
+
+    def restart_worker(self) -> None:
+        '''
+        Starts a fresh worker thread if the current one is gone. Needed after a
+        fork: the parent's thread doesn't exist in the child, so without this
+        no scheduled job would ever fire.
+        '''
+        if not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+
+                run_at, seq, job_id, func, interval = self._heap[0]
+                now = time.monotonic()
+                if run_at > now:
+                    # Sleep until the next deadline; a new earlier job wakes us
+                    self._cond.wait(timeout=run_at - now)
+                    continue
+
+                heapq.heappop(self._heap)
+                if job_id is not None:
+                    if self._live.get(job_id) != seq:
+                        # Cancelled or replaced since it was pushed
+                        continue
+                    if interval is not None:
+                        heapq.heappush(self._heap, (run_at + interval, seq, job_id, func, interval))
+
+            self._executor.submit(self._call, func)
+
+    def _call(self, func):
+        try:
+            func()
+        except Exception:
+            log.exception("Scheduled job raised")
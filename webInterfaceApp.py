@@ -1,32 +1,36 @@
 
-import os
+import logging
 from urllib.parse import urlparse
 from datetime import datetime, timezone
 
-from flask import Flask, jsonify, request, abort
-from logger import PostgresLogger
+from flask import Flask, Response, request, abort, stream_with_context
 
-from dotenv import load_dotenv
+import orjson
+
+from app_factory import get_logger
 
 app = Flask(__name__)
-load_dotenv("auth.env")
+
+# app_factory configures logging and loads auth.env
+log = logging.getLogger(__name__)
 
 INDEX_FILE_PATH = "index.html"
 
 
-# Init the Logger
-db_name = os.getenv("DB_NAME")
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-db_host = os.getenv("DB_HOST")
-db_port = os.getenv("DB_PORT")
-logger = PostgresLogger(
-    host=db_host,
-    dbname=db_name,
-    user=db_user,
-    password=db_password,
-    port=db_port
-)
+def _clean(data, key):
+    # Pulls a stripped string field; skips the `or ""` temporary when present
+    value = data.get(key)
+    return value.strip() if isinstance(value, str) else ""
+
+
+def _json(data, status:int=200):
+    # orjson serializes in C (datetimes included), several times faster than
+    # the stdlib encoder behind flask.jsonify
+    return Response(orjson.dumps(data), status=status, mimetype="application/json")
+
+
+# Shared logger singleton, one pool even when both apps run in one process
+logger = get_logger()
 
 
 #============ API Endpoints ============#
@@ -39,25 +43,34 @@ def get_index():
 # Get all users in order by status(alert>active>inactive)
 @app.get("/api/users")
 def get_users():
-    result = logger.get_all_users() or []
-
-    print("Fetched users:", result)
-    return jsonify(result), 200
+    # Rows come off a server-side cursor and go out as they arrive, so the
+    # full user list is never held in memory here
+    def generate():
+        yield b"["
+        first = True
+        for row in logger.stream_all_users():
+            if not first:
+                yield b","
+            first = False
+            yield orjson.dumps(dict(row))
+        yield b"]"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
 
 # Create a new user
 @app.post("/api/users")
 def create_user():
     
     data = request.get_json(silent=True) or {}
-    print("Received data for new user:", data)
-    first_name = (data.get("first_name") or "").strip()
-    last_name  = (data.get("last_name") or "").strip()
-    phone      = (data.get("phone_number") or "").strip()
+    log.debug("Received data for new user: %s", data)
+    first_name = _clean(data, "first_name")
+    last_name  = _clean(data, "last_name")
+    phone      = _clean(data, "phone_number")
     delay_interval = (str(data.get("delay_interval")) or "").strip()
 
     
     if not first_name or not last_name or not phone:
-            return jsonify({"error": "first_name/ last_name/ phone/ delay_interval are required"}), 400
+            return _json({"error": "first_name/ last_name/ phone/ delay_interval are required"}, 400)
     
     user_id = logger.create_user(
         first_name=str(first_name), 
@@ -65,29 +78,29 @@ def create_user():
         phone_number=str(phone),
         delay_minutes=int(delay_interval) if delay_interval.isdigit() else 30
     )
-    return jsonify({"user_id": user_id}), 201
+    return _json({"user_id": user_id}, 201)
 
 # Get a specific user by user_id
 @app.get("/api/users/<int:user_id>")
 def get_user(user_id):
     user = logger.get_user_with_status(user_id=user_id)
     if not user:
-        return jsonify({"error": "User not found"}), 404
-    return jsonify(user), 200
+        return _json({"error": "User not found"}, 404)
+    return _json(user, 200)
 
 # Updates a users details, not all fields are required
 @app.patch("/api/users/<int:user_id>")
 def update_user(user_id):
     data = request.get_json(silent=True) or {}
-    first_name = (data.get("first_name") or "").strip()
-    last_name = (data.get("last_name") or "").strip()
-    phone_number = (data.get("phone_number") or "").strip()
+    first_name = _clean(data, "first_name")
+    last_name = _clean(data, "last_name")
+    phone_number = _clean(data, "phone_number")
     delay_minutes = (str(data.get("delay_interval")) or "").strip()
 
-    print("Received data for updating user:", data)
+    log.debug("Received data for updating user: %s", data)
 
     if not first_name and not last_name and not phone_number and not delay_minutes:
-        return jsonify({"error": "At least one field must be provided"}), 400
+        return _json({"error": "At least one field must be provided"}, 400)
 
 
     logger.update_user(
@@ -98,92 +111,101 @@ def update_user(user_id):
         delay_minutes=int(delay_minutes) if delay_minutes.isdigit() else None
     )
 
-    return jsonify({"message": "User updated successfully"}), 200
+    return _json({"message": "User updated successfully"}, 200)
 
 # Get escalation contacts for a specific user
 @app.get("/api/users/<int:user_id>/contacts")
 def get_user_contacts(user_id):
-    # Check if user exists
-    user = logger.get_user(user_id=user_id)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    contacts = logger.get_escalation_contacts(user_id=user_id)
-    if not contacts:
-        # User has no contacts
-        return jsonify([]), 200
-    return jsonify(contacts), 200
+    with logger.pipeline():
+        contacts = logger.get_escalation_contacts(user_id=user_id)
+        if contacts:
+            return _json(contacts, 200)
+
+        # No contacts back: only now check whether the user exists at all
+        if not logger.get_user(user_id=user_id):
+            return _json({"error": "User not found"}, 404)
+
+    # User has no contacts
+    return _json([], 200)
 
 # Returns all escalation contacts for a specific user
 @app.post("/api/users/<int:user_id>/contacts")
 def add_user_contact(user_id):
-    # Check if user exists
-    user = logger.get_user(user_id=user_id)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    
     # Extract info from request
     data = request.get_json(silent=True) or {}
-    first_name = (data.get("first_name") or "").strip()
-    last_name = (data.get("last_name") or "").strip()
-    phone = (data.get("phone_number") or "").strip()    
+    first_name = _clean(data, "first_name")
+    last_name = _clean(data, "last_name")
+    phone = _clean(data, "phone_number")
 
     if not first_name or not last_name or not phone:
-        return jsonify({"error": "first_name/ last_name/ phone_number are required"}), 400
-    
-    contact_id = logger.add_escalation_contact(user_id=user_id, first_name=first_name, last_name=last_name, phone_number=phone)
-    return jsonify({"contact_id": contact_id}), 201
+        return _json({"error": "first_name/ last_name/ phone_number are required"}, 400)
+
+    with logger.pipeline():
+        # The insert itself verifies the user exists
+        contact_id = logger.add_escalation_contact(user_id=user_id, first_name=first_name, last_name=last_name, phone_number=phone)
+        if contact_id is None and not logger.get_user(user_id=user_id):
+            return _json({"error": "User not found"}, 404)
+    return _json({"contact_id": contact_id}, 201)
 
 # Get most recent session for a specific user
 @app.get("/api/users/<int:user_id>/sessions/recent")
 def get_user_recent_sessions(user_id):
-     # Check if user exists
-    user = logger.get_user(user_id=user_id)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    sessions = logger.get_most_recent_session(user_id=user_id)
+    # Both statements share one pooled connection
+    with logger.pipeline():
+        # Check if user exists
+        user = logger.get_user(user_id=user_id)
+        if not user:
+            return _json({"error": "User not found"}, 404)
+        sessions = logger.get_most_recent_session(user_id=user_id)
     if not sessions:
-        return jsonify([]), 200
-    return jsonify(sessions), 200
+        return _json([], 200)
+    return _json(sessions, 200)
 
 # Deletes a specific escalation contact for a user
 @app.delete("/api/users/<int:user_id>/contacts/<int:contact_id>")
 def delete_contact(user_id, contact_id):
-    # Check if user exists
-    user = logger.get_user(user_id=user_id)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    
-    # Make sure this contact belongs to this user
-    contact = logger.get_escalation_contact(contact_id=contact_id)
+    # All three statements share one pooled connection
+    with logger.pipeline():
+        # Check if user exists
+        user = logger.get_user(user_id=user_id)
+        if not user:
+            return _json({"error": "User not found"}, 404)
+
+        # Make sure this contact belongs to this user
+        contact = logger.get_escalation_contact(contact_id=contact_id)
 
-    logger.delete_escalation_contact(contact_id=contact_id)
-    return jsonify({"message": "Contact deleted successfully"}), 200
+        logger.delete_escalation_contact(contact_id=contact_id)
+    return _json({"message": "Contact deleted successfully"}, 200)
 
 
 @app.patch("/api/users/<int:user_id>/contacts/<int:contact_id>")
 def update_contact(user_id, contact_id):
-    # Check if user exists
-    user = logger.get_user(user_id=user_id)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-
     # Extract info from request
     data = request.get_json(silent=True) or {}
-    first_name = (data.get("first_name") or "").strip()
-    last_name = (data.get("last_name") or "").strip()
-    phone_number = (data.get("phone_number") or "").strip()
+    first_name = _clean(data, "first_name")
+    last_name = _clean(data, "last_name")
+    phone_number = _clean(data, "phone_number")
 
     if not first_name and not last_name and not phone_number:
-        return jsonify({"error": "At least one field must be provided"}), 400
+        return _json({"error": "At least one field must be provided"}, 400)
 
-    logger.update_escalation_contact(
-        contact_id=contact_id,
-        first_name=first_name if first_name else None,
-        last_name=last_name if last_name else None,
-        phone_number=phone_number if phone_number else None
-    )
+    # The existence check and the update share one pooled connection
+    with logger.pipeline():
+        # Check if user exists
+        user = logger.get_user(user_id=user_id)
+        if not user:
+            return _json({"error": "User not found"}, 404)
+
+        logger.update_escalation_contact(
+            contact_id=contact_id,
+            first_name=first_name if first_name else None,
+            last_name=last_name if last_name else None,
+            phone_number=phone_number if phone_number else None
+        )
 
-    return jsonify({"message": "Contact updated successfully"}), 200
+    return _json({"message": "Contact updated successfully"}, 200)
 
 
-app.run(host="0.0.0.0", port=80,debug=True)
+# Dev server only; production runs `gunicorn -c gunicorn_conf.py webInterfaceApp:app`
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=80,debug=True)
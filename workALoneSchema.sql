@@ -2,12 +2,22 @@
 CREATE TABLE IF NOT EXISTS users (
     id SERIAL PRIMARY KEY,
     phone_number TEXT UNIQUE NOT NULL,
+    -- digits of phone_number as a BIGINT, a fixed-width key indexes/probes faster than TEXT
+    phone_number_key BIGINT UNIQUE,
     first_name TEXT,
     last_name TEXT,
     delay_interval INT
 );
 
 
+-- migration for databases created before phone_number_key existed:
+-- CREATE TABLE IF NOT EXISTS skips them, so add and backfill the column here
+ALTER TABLE users ADD COLUMN IF NOT EXISTS phone_number_key BIGINT UNIQUE;
+UPDATE users
+SET phone_number_key = NULLIF(regexp_replace(phone_number, '\D', '', 'g'), '')::BIGINT
+WHERE phone_number_key IS NULL;
+
+
 CREATE TABLE IF NOT EXISTS escalation_contacts (
     id SERIAL PRIMARY KEY,
     contact_of INT NOT NULL,
@@ -45,8 +55,16 @@ CREATE TABLE IF NOT EXISTS message_logs (
 
 
 
-CREATE INDEX ON escalation_contacts(contact_of);
-CREATE INDEX ON sessions(user_id);
+-- the composite also covers plain contact_of lookups; (contact_of, phone_number)
+-- is the exact predicate of get_escalation_contact
+CREATE INDEX ON escalation_contacts(contact_of, phone_number);
+-- serves last-check-in lookups (newest session per user) as a single index probe
+CREATE INDEX ON sessions(user_id, last_check_in_at DESC NULLS LAST);
+-- tiny partial indexes for the two statuses the hot paths filter on:
+-- get_active_session probes status='active', the escalation-contact timeout
+-- lookup scans status='alert' newest-first
+CREATE INDEX ON sessions(user_id) WHERE status = 'active';
+CREATE INDEX ON sessions(user_id, last_check_in_at DESC) WHERE status = 'alert';
 CREATE INDEX ON sessions(checked_in_by_contact_id);
 CREATE INDEX ON message_logs(user_id);
 CREATE INDEX ON message_logs(contact_id);